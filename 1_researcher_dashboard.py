@@ -2,21 +2,24 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-import pytz
+from zoneinfo import ZoneInfo
 import io
 import zipfile
 
-# 固定构件目标（StepID -> 构件名 + 编号列表）
+# 时区对象在脚本顶部绑定，本次 rerun 内各处共用（ZoneInfo 自身按名称缓存实例）
+_EDMONTON_TZ = ZoneInfo("America/Edmonton")
+
+# 固定构件目标（StepID -> 构件名 + 编号集合）
 STEP_TARGETS = {
-    1: ("2. Platform", ["2"]),
-    2: ("11. Anti-Tip Assembly", ["11"]),
-    3: ("9. 5 in.caster / 1. Lower Ladder", ["9", "1"]),
-    4: ("3. Mounting Bracket", ["3"]),
-    5: ("5. Brace", ["5"]),
-    6: ("4. Piece Support / 12. Tightening Knob", ["4", "12"]),
-    7: ("6. Shelf Brace", ["6"]),
-    8: ("10. Locking Pin", ["10"]),
-    9: ("8. Wire Grid Shelf -L- / 7. Wire Grid Shelf -S-", ["8", "7"])
+    1: ("2. Platform", frozenset({"2"})),
+    2: ("11. Anti-Tip Assembly", frozenset({"11"})),
+    3: ("9. 5 in.caster / 1. Lower Ladder", frozenset({"9", "1"})),
+    4: ("3. Mounting Bracket", frozenset({"3"})),
+    5: ("5. Brace", frozenset({"5"})),
+    6: ("4. Piece Support / 12. Tightening Knob", frozenset({"4", "12"})),
+    7: ("6. Shelf Brace", frozenset({"6"})),
+    8: ("10. Locking Pin", frozenset({"10"})),
+    9: ("8. Wire Grid Shelf -L- / 7. Wire Grid Shelf -S-", frozenset({"8", "7"}))
 }
 
 # 受试者编号 -> 系统顺序（按3步一组）
@@ -35,13 +38,64 @@ PARTICIPANT_SYSTEM_ORDER = {
     12: ["Step-Aware CV", "Static AR", "Full CV"]
 }
 
+# 未预设编号时使用的默认系统顺序
+DEFAULT_SYSTEM_ORDER = ["Static AR", "Full CV", "Step-Aware CV"]
+
+# Likert 量表选项 -> 分值
+LIKERT_LABELS = ("1 (Strongly Disagree)", "2", "3", "4", "5", "6", "7 (Strongly Agree)")
+_LIKERT_MAP = {label: i + 1 for i, label in enumerate(LIKERT_LABELS)}
+
+# 问卷题目（题号, 题干）
+SART_QUESTIONS = (
+    ("SART_1", "I received enough information to help me quickly identify the target component.（我获得了足够的信息来帮助我快速查找到目标构件。）"),
+    ("SART_2", "The information provided by the system was clear and accurate.（系统提供的信息清晰、准确，有助于我识别正确的构件。）"),
+    ("SART_3", "I clearly understood what was happening during the component search tasks.（我能清楚理解查找任务中的提示与状态信息。）"),
+    ("SART_4", "The task environment and recognition process were complex.（任务环境和识别过程较为复杂。）"),
+    ("SART_5", "The task environment and information changed unexpectedly or frequently during the task.（任务环境和出现的信息变化频繁或难以预料。）"),
+    ("SART_6", "The system behavior or visual information was inconsistent or unpredictable during the task.（任务中系统行为或视觉提示不一致或不可预测。）"),
+    ("SART_7", "I had to concentrate intensely to stay focused during the entire object search process.（我必须全程高度集中注意力，才能在整个构件查找过程中保持专注。）"),
+    ("SART_8", "I still had enough mental resources left to process other environmental information during the task.（我还有足够的精力来注意其他环境信息。）"),
+    ("SART_9", "I had to exert a lot of effort to understand the system’s instructions and locate the correct component.（我必须付出很大努力才能理解系统提示并找到正确的构件。）"),
+    ("SART_10", "I remained alert and attentive throughout the tasks.（我在任务中始终保持专注与警觉。）")
+)
+
+SU_QUESTIONS = (
+    ("SU_1", "This system provided information that was highly relevant to my task.（该系统提供的信息与我当前的任务高度相关。）"),
+    ("SU_2", "This system’s prompts effectively guided me to the correct target.（该系统的提示成功引导我找到正确目标。）"),
+    ("SU_3", "This system’s visual prompts were excessive or distracting.（该系统的提示信息过多或让我感到分心。）"),
+    ("SU_4", "The prompts were stable and consistent throughout this system.（该系统的提示表现稳定、一致，没有跳动或不连贯。）"),
+    ("SU_5", "I trusted this system’s information to be reliable and accurate.（我信任该系统提供的信息是可靠且准确的。）"),
+    ("SU_6", "The system provided guidance at appropriate timing.（该系统在恰当的时间点提供了提示，有助于我及时完成任务。）"),
+    ("SU_7", "The system’s interface was visually clean and well-organized.（该系统界面整洁、信息排布合理，不混乱。）"),
+    ("SU_8", "Overall, I am satisfied with using this system.（总体而言，我对该系统的使用体验感到满意。）")
+)
+
+TLX_QUESTIONS = (
+    ("TLX_1", "How mentally demanding was the task?（这个任务在心理/思维上对你有多大挑战？）"),
+    ("TLX_2", "How physically demanding was the task?（这个任务在体力上对你有多大挑战？）"),
+    ("TLX_3", "How hurried or rushed was the pace of the task?（这个任务的节奏是否让你感觉匆忙或赶时间？）"),
+    ("TLX_4", "How successful were you in accomplishing what you were asked to do?（你认为自己完成任务的成功程度如何？）"),
+    ("TLX_5", "How hard did you have to work to accomplish your level of performance?（为了达到目前的任务表现，你付出了多大努力？）"),
+    ("TLX_6", "How insecure, discouraged, irritated, stressed, and annoyed were you?（你在任务中感到多少不安、沮丧、焦虑、烦躁？）")
+)
+
+# 问卷导出列（顺序固定）
+QUESTIONNAIRE_COLS = ["Participant", "System"] + [k for k, _ in SART_QUESTIONS + SU_QUESTIONS + TLX_QUESTIONS]
+
 
 # 初始化 session 状态
-if 'current_step' not in st.session_state:
-    st.session_state.current_step = 1
-    st.session_state.data = []
-    st.session_state.systems = []
-    st.session_state.show_questionnaire = False
+# 实验与问卷记录分开保存，重做步骤时按键直接覆盖：
+#   experiment_rows: (Participant, StepID) -> 记录
+#   questionnaire_rows: (Participant, System) -> 记录
+for key, default in (
+    ('current_step', 1),
+    ('experiment_rows', {}),
+    ('questionnaire_rows', {}),
+    ('systems', []),
+    ('show_questionnaire', False),
+    ('step_records', {}),
+):
+    st.session_state.setdefault(key, default)
 
 def get_current_system():
     idx = (st.session_state.current_step - 1) // 3
@@ -55,33 +109,39 @@ def setup_page():
     if system_order:
         st.success(f"✅ 系统顺序为：{' → '.join(system_order)}")
     else:
-        st.warning("⚠️ 当前编号没有预设系统顺序，将使用默认顺序：Static AR → Full CV → Step-Aware CV")
+        st.warning(f"⚠️ 当前编号没有预设系统顺序，将使用默认顺序：{' → '.join(DEFAULT_SYSTEM_ORDER)}")
 
     if st.button("开始实验"):
         st.session_state.participant_id = f"{participant_id:02d}"  # 编号格式为 '01', '02', etc.
-        st.session_state.systems = system_order or ["Static AR", "Full CV", "Step-Aware CV"]
+        st.session_state.systems = system_order or DEFAULT_SYSTEM_ORDER
         st.session_state.current_step = 1
         st.rerun()
 
-# 在session_state中添加统一的数据结构
-if 'step_records' not in st.session_state:
-    st.session_state.step_records = {}
-    
+# 已用时面板以 1 Hz 局部刷新，不触发整页 rerun
+@st.fragment(run_every=1)
+def show_elapsed(record):
+    elapsed = round((datetime.now(_EDMONTON_TZ) - record['start_time_dt']).total_seconds(), 1)
+    st.info(f"🕒 本步骤已用时: {elapsed}秒")
+
 def record_step():
     current_step = st.session_state.current_step
     current_system = get_current_system()
-    target_label, target_ids = STEP_TARGETS.get(current_step, ("N/A", []))
+    target_label, target_ids = STEP_TARGETS.get(current_step, ("N/A", frozenset()))
     
     # 初始化当前步骤的记录
     if current_step not in st.session_state.step_records:
         st.session_state.step_records[current_step] = {
             'start_time': None,
+            'start_time_dt': None,  # datetime 对象，避免每次 rerun 重新解析
             'attempts': [],  # 存储每次尝试 {timestamp, answer, is_correct}
+            'error_count': 0,
             'first_correct_time': None,
-            'final_correct_time': None
+            'final_correct_time': None,
+            'final_correct_dt': None
         }
     
     record = st.session_state.step_records[current_step]
+    now = datetime.now(_EDMONTON_TZ)
     
     st.header(f"步骤 {current_step}/9")
     st.subheader(f"当前系统: {current_system}")
@@ -90,7 +150,8 @@ def record_step():
     # 步骤开始按钮
     if not record['start_time']:
         if st.button("▶️ 开始本步骤任务（点击后开始计时）"):
-            record['start_time'] = datetime.now(pytz.timezone("America/Edmonton")).isoformat()
+            record['start_time'] = now.isoformat()
+            record['start_time_dt'] = now
             st.rerun()
         st.stop()
     
@@ -102,12 +163,10 @@ def record_step():
         submitted = st.form_submit_button("提交尝试")
         
         if submitted and answer:
-            now = datetime.now(pytz.timezone("America/Edmonton"))
             timestamp = now.isoformat()
             
             # 检查答案是否正确
-            answer_list = [s.strip() for s in answer.split() if s.strip()]
-            is_correct = any(ans in target_ids for ans in answer_list)
+            is_correct = not target_ids.isdisjoint(answer.split())
             
             # 记录尝试
             attempt = {
@@ -124,36 +183,27 @@ def record_step():
             # 如果是最终正确（用户确认）
             if is_correct:
                 record['final_correct_time'] = timestamp
+                record['final_correct_dt'] = now
                 st.success("✅ 回答正确！")
             else:
+                record['error_count'] += 1
                 st.error("❌ 回答错误，请继续尝试")
     
     # 显示当前状态
-    start_time = datetime.fromisoformat(record['start_time'])
-    elapsed = round((datetime.now(pytz.timezone("America/Edmonton")) - start_time).total_seconds(), 1)
-    
     col1, col2 = st.columns(2)
     with col1:
-        st.info(f"🕒 本步骤已用时: {elapsed}秒")
+        show_elapsed(record)
         st.info(f"📊 尝试次数: {len(record['attempts'])}")
     
     with col2:
         if record['final_correct_time']:
             st.success(f"🏁 最终确认时间: {record['final_correct_time']}")
     
-    # 计算错误次数
-    error_count = sum(1 for a in record['attempts'] if not a['is_correct'])
-    
     # 完成步骤按钮（仅在用户有正确尝试时可用）
     if record['final_correct_time']:
         if st.button("✅ 完成本步骤"):
             # 计算总耗时
-            start_time = datetime.fromisoformat(record['start_time'])
-            final_correct_time = datetime.fromisoformat(record['final_correct_time'])
-            total_duration = round((final_correct_time - start_time).total_seconds(), 2)
-            
-            # 计算错误次数
-            error_count = sum(1 for a in record['attempts'] if not a['is_correct'])
+            total_duration = round((record['final_correct_dt'] - record['start_time_dt']).total_seconds(), 2)
             
             # 保存实验记录
             step_data = {
@@ -166,11 +216,11 @@ def record_step():
                 "EndTime": record['final_correct_time'],
                 "TotalDuration": total_duration,
                 "AttemptCount": len(record['attempts']),
-                "ErrorCount": error_count,
+                "ErrorCount": record['error_count'],
                 "Note": note
             }
             
-            st.session_state.data.append(step_data)
+            st.session_state.experiment_rows[(st.session_state.participant_id, current_step)] = step_data
             
             # 进入下一步或问卷
             if current_step % 3 == 0:
@@ -188,9 +238,12 @@ def record_step():
     if col2.button("↩️ 重置本步骤"):
         st.session_state.step_records[current_step] = {
             'start_time': record['start_time'],  # 保留开始时间
+            'start_time_dt': record['start_time_dt'],
             'attempts': [],
+            'error_count': 0,
             'first_correct_time': None,
-            'final_correct_time': None
+            'final_correct_time': None,
+            'final_correct_dt': None
         }
         st.rerun()
 
@@ -205,50 +258,18 @@ def questionnaire():
     with st.form("questionnaire_form"):
         st.subheader("📋 Unified Post-Task Questionnaire")
         st.markdown("Please rate your agreement with each of the following statements. (1 = Strongly Disagree, 7 = Strongly Agree)")
-        likert_labels = ["1 (Strongly Disagree)", "2", "3", "4", "5", "6", "7 (Strongly Agree)"]
-        def parse(label): return int(label[0])
 
         # SART
         st.markdown("### 🧠 SART – Situation Awareness")
-        sart_questions = [
-            ("SART_1", "I received enough information to help me quickly identify the target component.（我获得了足够的信息来帮助我快速查找到目标构件。）"),
-            ("SART_2", "The information provided by the system was clear and accurate.（系统提供的信息清晰、准确，有助于我识别正确的构件。）"),
-            ("SART_3", "I clearly understood what was happening during the component search tasks.（我能清楚理解查找任务中的提示与状态信息。）"),
-            ("SART_4", "The task environment and recognition process were complex.（任务环境和识别过程较为复杂。）"),
-            ("SART_5", "The task environment and information changed unexpectedly or frequently during the task.（任务环境和出现的信息变化频繁或难以预料。）"),
-            ("SART_6", "The system behavior or visual information was inconsistent or unpredictable during the task.（任务中系统行为或视觉提示不一致或不可预测。）"),
-            ("SART_7", "I had to concentrate intensely to stay focused during the entire object search process.（我必须全程高度集中注意力，才能在整个构件查找过程中保持专注。）"),
-            ("SART_8", "I still had enough mental resources left to process other environmental information during the task.（我还有足够的精力来注意其他环境信息。）"),
-            ("SART_9", "I had to exert a lot of effort to understand the system’s instructions and locate the correct component.（我必须付出很大努力才能理解系统提示并找到正确的构件。）"),
-            ("SART_10", "I remained alert and attentive throughout the tasks.（我在任务中始终保持专注与警觉。）")
-        ]
-        sart = {k: st.radio(v, likert_labels, horizontal=True, index=None) for k, v in sart_questions}
+        sart = {k: st.radio(v, LIKERT_LABELS, horizontal=True, index=None) for k, v in SART_QUESTIONS}
 
         # System Usability
         st.markdown("### 💻 System Usability & Experience")
-        su_questions = [
-            ("SU_1", "This system provided information that was highly relevant to my task.（该系统提供的信息与我当前的任务高度相关。）"),
-            ("SU_2", "This system’s prompts effectively guided me to the correct target.（该系统的提示成功引导我找到正确目标。）"),
-            ("SU_3", "This system’s visual prompts were excessive or distracting.（该系统的提示信息过多或让我感到分心。）"),
-            ("SU_4", "The prompts were stable and consistent throughout this system.（该系统的提示表现稳定、一致，没有跳动或不连贯。）"),
-            ("SU_5", "I trusted this system’s information to be reliable and accurate.（我信任该系统提供的信息是可靠且准确的。）"),
-            ("SU_6", "The system provided guidance at appropriate timing.（该系统在恰当的时间点提供了提示，有助于我及时完成任务。）"),
-            ("SU_7", "The system’s interface was visually clean and well-organized.（该系统界面整洁、信息排布合理，不混乱。）"),
-            ("SU_8", "Overall, I am satisfied with using this system.（总体而言，我对该系统的使用体验感到满意。）")
-        ]
-        su = {k: st.radio(v, likert_labels, horizontal=True, index=None) for k, v in su_questions}
+        su = {k: st.radio(v, LIKERT_LABELS, horizontal=True, index=None) for k, v in SU_QUESTIONS}
 
         # NASA-TLX
         st.markdown("### ⚙️ NASA-TLX – Task Load Index")
-        tlx_questions = [
-            ("TLX_1", "How mentally demanding was the task?（这个任务在心理/思维上对你有多大挑战？）"),
-            ("TLX_2", "How physically demanding was the task?（这个任务在体力上对你有多大挑战？）"),
-            ("TLX_3", "How hurried or rushed was the pace of the task?（这个任务的节奏是否让你感觉匆忙或赶时间？）"),
-            ("TLX_4", "How successful were you in accomplishing what you were asked to do?（你认为自己完成任务的成功程度如何？）"),
-            ("TLX_5", "How hard did you have to work to accomplish your level of performance?（为了达到目前的任务表现，你付出了多大努力？）"),
-            ("TLX_6", "How insecure, discouraged, irritated, stressed, and annoyed were you?（你在任务中感到多少不安、沮丧、焦虑、烦躁？）")
-        ]
-        tlx = {k: st.radio(v, likert_labels, horizontal=True, index=None) for k, v in tlx_questions}
+        tlx = {k: st.radio(v, LIKERT_LABELS, horizontal=True, index=None) for k, v in TLX_QUESTIONS}
 
         col1, col2 = st.columns([1, 1])
         back = col1.form_submit_button("⬅️ 返回上一步")
@@ -270,15 +291,12 @@ def questionnaire():
             result = {
                 "RecordType": "Questionnaire",  # 明确标记为问卷数据
                 "Participant": st.session_state.participant_id,
-                "System": current_system
+                "System": current_system,
+                # 添加问卷答案
+                **{k: _LIKERT_MAP[v] for answers in (sart, su, tlx) for k, v in answers.items()}
             }
             
-            # 添加问卷答案
-            result.update({k: parse(v) for k, v in sart.items()})
-            result.update({k: parse(v) for k, v in su.items()})
-            result.update({k: parse(v) for k, v in tlx.items()})
-            
-            st.session_state.data.append(result)
+            st.session_state.questionnaire_rows[(st.session_state.participant_id, current_system)] = result
             st.session_state.show_questionnaire = False
             st.session_state.current_step += 1
             
@@ -286,49 +304,52 @@ def questionnaire():
                 st.session_state.experiment_complete = True
             st.rerun()
 
-# 主控制流
-if 'participant_id' not in st.session_state:
-    setup_page()
-elif getattr(st.session_state, 'show_questionnaire', False):
-    questionnaire()
-elif st.session_state.current_step <= 9:
-    record_step()
-else:
-    st.success("✅ 实验完成！Experiment Complete!")
-
-    df = pd.DataFrame(st.session_state.data)
-
-    # 分离实验数据和问卷数据
-    experiment_data = [r for r in st.session_state.data if r.get("RecordType") == "Experiment"]
-    questionnaire_data = [r for r in st.session_state.data if r.get("RecordType") == "Questionnaire"]
-
+# 打包导出数据；输入不变时直接返回缓存的 zip 字节
+@st.cache_data(show_spinner=False, ttl=24 * 60 * 60)
+def build_zip(experiment_rows, questionnaire_rows):
     # 创建独立的数据框
-    experiment_df = pd.DataFrame(experiment_data)
-    questionnaire_df = pd.DataFrame(questionnaire_data)
+    experiment_df = pd.DataFrame(list(experiment_rows))
+    questionnaire_df = pd.DataFrame(list(questionnaire_rows))
 
     # 创建内存中的 zip 文件
     zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
+    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zip_file:
         # 添加实验数据 CSV
         if not experiment_df.empty:
-            zip_file.writestr("experiment_data.csv", experiment_df.to_csv(index=False))
+            with zip_file.open("experiment_data.csv", "w") as f, io.TextIOWrapper(f, encoding="utf-8", newline="") as csv_file:
+                experiment_df.to_csv(csv_file, index=False)
         
         # 添加问卷数据 CSV
         if not questionnaire_df.empty:
             # 清理问卷数据，只保留必要列
-            questionnaire_clean = questionnaire_df[[
-                "Participant", "System",
-                *[col for col in questionnaire_df.columns if col.startswith("SART_")],
-                *[col for col in questionnaire_df.columns if col.startswith("SU_")],
-                *[col for col in questionnaire_df.columns if col.startswith("TLX_")]
-            ]]
-            zip_file.writestr("questionnaire_data.csv", questionnaire_clean.to_csv(index=False))
+            questionnaire_clean = questionnaire_df.reindex(columns=QUESTIONNAIRE_COLS)
+            with zip_file.open("questionnaire_data.csv", "w") as f, io.TextIOWrapper(f, encoding="utf-8", newline="") as csv_file:
+                questionnaire_clean.to_csv(csv_file, index=False)
+
+    return zip_buffer.getvalue()
+
+# 主控制流
+if 'participant_id' not in st.session_state:
+    setup_page()
+elif getattr(st.session_state, 'show_questionnaire', False):
+    questionnaire()
+elif st.session_state.current_step <= 9:
+    record_step()
+else:
+    st.success("✅ 实验完成！Experiment Complete!")
+
+    # 数据在实验完成后不再变化，zip 只需生成一次
+    if 'export_zip' not in st.session_state:
+        st.session_state.export_zip = build_zip(
+            tuple(st.session_state.experiment_rows.values()),
+            tuple(st.session_state.questionnaire_rows.values())
+        )
 
     # 准备 Streamlit 下载按钮
     st.markdown("### 📦 下载所有数据 ZIP 文件")
     st.download_button(
         label="📥 下载 ZIP 文件",
-        data=zip_buffer.getvalue(),
+        data=st.session_state.export_zip,
         file_name="experiment_package.zip",
         mime="application/zip"
     )
\ No newline at end of file
@@ -1,50 +1,160 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-import pytz
+from zoneinfo import ZoneInfo
 import io
 import zipfile
+import importlib.util
 
-# 固定构件目标（StepID -> 构件名 + 编号列表）
-STEP_TARGETS = {
-    1: ("2. Platform", ["2"]),
-    2: ("11. Anti-Tip Assembly", ["11"]),
-    3: ("9. 5 in.caster / 1. Lower Ladder", ["9", "1"]),
-    4: ("3. Mounting Bracket", ["3"]),
-    5: ("5. Brace", ["5"]),
-    6: ("4. Piece Support / 12. Tightening Knob", ["4", "12"]),
-    7: ("6. Shelf Brace", ["6"]),
-    8: ("10. Locking Pin", ["10"]),
-    9: ("8. Wire Grid Shelf -L- / 7. Wire Grid Shelf -S-", ["8", "7"])
-}
+# 时区对象在脚本顶部绑定，本次 rerun 内各处共用（ZoneInfo 自身按名称缓存实例）
+_TZ = ZoneInfo("America/Edmonton")
 
-# 步骤分组定义
-GROUP_STEPS = {
-    "A": [1, 2, 3],
-    "B": [4, 5, 6],
-    "C": [7, 8, 9]
-}
+# Parquet 导出为可选功能，仅在安装了 pyarrow 时提供
+_HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+# 固定构件目标（下标为 StepID，0 号位占位：构件名 + 编号集合）
+_STEP_TARGETS = (
+    ("N/A", frozenset()),
+    ("2. Platform", frozenset({"2"})),
+    ("11. Anti-Tip Assembly", frozenset({"11"})),
+    ("9. 5 in.caster / 1. Lower Ladder", frozenset({"9", "1"})),
+    ("3. Mounting Bracket", frozenset({"3"})),
+    ("5. Brace", frozenset({"5"})),
+    ("4. Piece Support / 12. Tightening Knob", frozenset({"4", "12"})),
+    ("6. Shelf Brace", frozenset({"6"})),
+    ("10. Locking Pin", frozenset({"10"})),
+    ("8. Wire Grid Shelf -L- / 7. Wire Grid Shelf -S-", frozenset({"8", "7"}))
+)
+
+# 步骤分组定义（下标为 StepID，0 号位占位）
+_STEP_TO_GROUP = (None, "A", "A", "A", "B", "B", "B", "C", "C", "C")
+
+# 修正后的拉丁方设计：受试者 1-4 / 5-8 / 9-12 各用一行，行内依次为 A/B/C 组的系统下标
+_SYSTEMS = ("Static AR", "Full CV", "Step-Aware CV")
+_LATIN_ROWS = ((0, 1, 2), (1, 2, 0), (2, 0, 1))
+_GROUP_IDX = {"A": 0, "B": 1, "C": 2}
+
+# Likert 量表选项 -> 分值
+_LIKERT_LABELS = ("1 (Strongly Disagree)", "2", "3", "4", "5", "6", "7 (Strongly Agree)")
+_LIKERT_SCORE = {label: i + 1 for i, label in enumerate(_LIKERT_LABELS)}
+
+# 问卷题目（题号, 英文, 中文）
+_SART_QUESTIONS = (
+    ("SART_1",
+     "I received enough information to help me quickly identify the target component.",
+     "我获得了足够的信息来帮助我快速查找到目标构件。"),
+    ("SART_2",
+     "The information provided by the system was clear and accurate.",
+     "系统提供的信息清晰、准确，有助于我识别正确的构件。"),
+    ("SART_3",
+     "I clearly understood what was happening during the component search tasks.",
+     "我能清楚理解查找任务中的提示与状态信息。"),
+    ("SART_4",
+     "The task environment and recognition process were complex.",
+     "任务环境和识别过程较为复杂。"),
+    ("SART_5",
+     "The task environment and information changed unexpectedly or frequently during the task.",
+     "任务环境和出现的信息变化频繁或难以预料。"),
+    ("SART_6",
+     "The system behavior or visual information was inconsistent or unpredictable during the task.",
+     "任务中系统行为或视觉提示不一致或不可预测。"),
+    ("SART_7",
+     "I had to concentrate intensely to stay focused during the entire object search process.",
+     "我必须全程高度集中注意力，才能在整个构件查找过程中保持专注。"),
+    ("SART_8",
+     "I still had enough mental resources left to process other environmental information during the task.",
+     "我还有足够的精力来注意其他环境信息。"),
+    ("SART_9",
+     "I had to exert a lot of effort to understand the system's instructions and locate the correct component.",
+     "我必须付出很大努力才能理解系统提示并找到正确的构件。"),
+    ("SART_10",
+     "I remained alert and attentive throughout the tasks.",
+     "我在任务中始终保持专注与警觉。")
+)
 
-# 修正后的拉丁方设计分配表（根据您提供的正确顺序）
-LATIN_SQUARE = {
-    1: {"A": "Static AR", "B": "Full CV", "C": "Step-Aware CV"},
-    2: {"A": "Static AR", "B": "Full CV", "C": "Step-Aware CV"},
-    3: {"A": "Static AR", "B": "Full CV", "C": "Step-Aware CV"},
-    4: {"A": "Static AR", "B": "Full CV", "C": "Step-Aware CV"},
-    5: {"A": "Full CV", "B": "Step-Aware CV", "C": "Static AR"},
-    6: {"A": "Full CV", "B": "Step-Aware CV", "C": "Static AR"},
-    7: {"A": "Full CV", "B": "Step-Aware CV", "C": "Static AR"},
-    8: {"A": "Full CV", "B": "Step-Aware CV", "C": "Static AR"},
-    9: {"A": "Step-Aware CV", "B": "Static AR", "C": "Full CV"},
-    10: {"A": "Step-Aware CV", "B": "Static AR", "C": "Full CV"},
-    11: {"A": "Step-Aware CV", "B": "Static AR", "C": "Full CV"},
-    12: {"A": "Step-Aware CV", "B": "Static AR", "C": "Full CV"}
+_SU_QUESTIONS = (
+    ("SU_1",
+     "This system provided information that was highly relevant to my task.",
+     "该系统提供的信息与我当前的任务高度相关。"),
+    ("SU_2",
+     "This system's prompts effectively guided me to the correct target.",
+     "该系统的提示成功引导我找到正确目标。"),
+    ("SU_3",
+     "This system's visual prompts were excessive or distracting.",
+     "该系统的提示信息过多或让我感到分心。"),
+    ("SU_4",
+     "The prompts were stable and consistent throughout this system.",
+     "该系统的提示表现稳定、一致，没有跳动或不连贯。"),
+    ("SU_5",
+     "I trusted this system's information to be reliable and accurate.",
+     "我信任该系统提供的信息是可靠且准确的。"),
+    ("SU_6",
+     "The system provided guidance at appropriate timing.",
+     "该系统在恰当的时间点提供了提示，有助于我及时完成任务。"),
+    ("SU_7",
+     "The system's interface was visually clean and well-organized.",
+     "该系统界面整洁、信息排布合理，不混乱。"),
+    ("SU_8",
+     "Overall, I am satisfied with using this system.",
+     "总体而言，我对该系统的使用体验感到满意。")
+)
+
+_TLX_QUESTIONS = (
+    ("TLX_1",
+     "How mentally demanding was the task?",
+     "这个任务在心理/思维上对你有多大挑战？"),
+    ("TLX_2",
+     "How physically demanding was the task?",
+     "这个任务在体力上对你有多大挑战？"),
+    ("TLX_3",
+     "How hurried or rushed was the pace of the task?",
+     "这个任务的节奏是否让你感觉匆忙或赶时间？"),
+    ("TLX_4",
+     "How successful were you in accomplishing what you were asked to do?",
+     "你认为自己完成任务的成功程度如何？"),
+    ("TLX_5",
+     "How hard did you have to work to accomplish your level of performance?",
+     "为了达到目前的任务表现，你付出了多大努力？"),
+    ("TLX_6",
+     "How insecure, discouraged, irritated, stressed, and annoyed were you?",
+     "你在任务中感到多少不安、沮丧、焦虑、烦躁？")
+)
+
+# 导出列定义：实验/问卷记录按此顺序以元组保存
+_EXP_COLS = (
+    "Participant", "StepID", "StepGroup", "System", "TargetLabel",
+    "StartTime", "EndTime", "TotalDuration", "AttemptCount",
+    "ErrorCount", "FirstAttemptCorrect", "Note"
+)
+_Q_COLS = (
+    "Participant", "System", "StepGroup",
+    *(k for k, _, _ in _SART_QUESTIONS + _SU_QUESTIONS + _TLX_QUESTIONS)
+)
+
+# 导出列的显式类型（量表得分用可空整数）
+_COL_DTYPES = {
+    "StepID": "int8", "TotalDuration": "float32",
+    "AttemptCount": "int16", "ErrorCount": "int16",
+    "FirstAttemptCorrect": "bool",
+    **{k: "Int8" for k in _Q_COLS[3:]}
 }
 
+# 问卷说明文字（在表单顶部显示一次）
+_SYSTEM_HEADER_TMPL = """
+**System being evaluated: `{system}`**
+
+Please evaluate this system (the one you just used in the last round of tasks) based on your experience in completing the component search tasks.  
+Use a 7-point scale: 1 = Strongly disagree, 7 = Strongly agree.
+
+请根据您刚刚完成的构件查找任务，评价“该系统”（当前轮次所使用的系统）的表现。  
+每个问题请根据您的实际体验程度，选择 1 到 7 分（1 = 非常不同意，7 = 非常同意）。
+"""
+
 # 初始化 session 状态
 if 'current_step' not in st.session_state:
     st.session_state.current_step = 1
-    st.session_state.data = []
+    st.session_state.experiment_rows = []  # 按 _EXP_COLS 顺序的元组
+    st.session_state.questionnaire_rows = []  # 按 _Q_COLS 顺序的元组
     st.session_state.show_questionnaire = False
     st.session_state.show_group_complete = False
     st.session_state.step_records = {}
@@ -52,26 +162,20 @@ if 'current_step' not in st.session_state:
 
 def get_current_group(step):
     """获取当前步骤所属的组(A/B/C)"""
-    for group, steps in GROUP_STEPS.items():
-        if step in steps:
-            return group
-    return "Unknown"
+    return _STEP_TO_GROUP[step] if 1 <= step <= 9 else "Unknown"
 
 def get_system_for_group(participant_id, group):
-    """根据拉丁方设计获取指定组的系统"""
-    participant_id = int(participant_id)
-    if participant_id in LATIN_SQUARE:
-        return LATIN_SQUARE[participant_id].get(group, "Unknown")
-    return {"A": "Static AR", "B": "Full CV", "C": "Step-Aware CV"}[group]
-
-def get_current_system(participant_id, step):
-    """获取当前步骤的系统"""
-    group = get_current_group(step)
-    return get_system_for_group(participant_id, group)
+    """根据拉丁方设计获取指定组的系统（participant_id 为整数）"""
+    if group not in _GROUP_IDX:
+        return "Unknown"
+    # 超出 1-12 的编号使用默认顺序（第一行）
+    row = _LATIN_ROWS[(participant_id - 1) // 4] if 1 <= participant_id <= 12 else _LATIN_ROWS[0]
+    return _SYSTEMS[row[_GROUP_IDX[group]]]
 
-def parse_likert(label):
-    """解析Likert量表的选择"""
-    return int(label[0]) if label and label[0].isdigit() else None
+def records_to_df(rows, columns):
+    """将记录元组构建为带显式类型的数据框"""
+    df = pd.DataFrame.from_records(rows, columns=columns)
+    return df.astype({col: _COL_DTYPES[col] for col in columns if col in _COL_DTYPES})
 
 # 实验设置页面
 def setup_page():
@@ -82,27 +186,27 @@ def setup_page():
         st.warning("⚠️ 当前编号超出预设范围(1-12)，将使用默认系统顺序")
     
     # 显示系统分配
-    if participant_id in LATIN_SQUARE:
-        systems = LATIN_SQUARE[participant_id]
+    if participant_id <= 12:
         st.success(f"✅ 系统分配：")
-        st.markdown(f"- **步骤组 A (步骤 1-3):** {systems['A']}")
-        st.markdown(f"- **步骤组 B (步骤 4-6):** {systems['B']}")
-        st.markdown(f"- **步骤组 C (步骤 7-9):** {systems['C']}")
+        st.markdown(f"- **步骤组 A (步骤 1-3):** {get_system_for_group(participant_id, 'A')}")
+        st.markdown(f"- **步骤组 B (步骤 4-6):** {get_system_for_group(participant_id, 'B')}")
+        st.markdown(f"- **步骤组 C (步骤 7-9):** {get_system_for_group(participant_id, 'C')}")
     else:
         st.success("✅ 系统顺序：Static AR → Full CV → Step-Aware CV")
 
     if st.button("开始实验"):
         st.session_state.participant_id = f"{participant_id:02d}"  # 编号格式为 '01', '02', etc.
+        st.session_state.participant_id_int = int(participant_id)
         st.session_state.current_step = 1
         st.rerun()
 
 # 记录步骤页面
 def record_step():
     current_step = st.session_state.current_step
-    participant_id = int(st.session_state.participant_id)
-    current_system = get_current_system(participant_id, current_step)
+    participant_id = st.session_state.participant_id_int
     current_group = get_current_group(current_step)
-    target_label, target_ids = STEP_TARGETS.get(current_step, ("N/A", []))
+    current_system = get_system_for_group(participant_id, current_group)
+    target_label, target_ids = _STEP_TARGETS[current_step]
     
     st.header(f"步骤 {current_step}/9")
     st.subheader(f"当前系统: {current_system} | 步骤组: {current_group}")
@@ -113,16 +217,19 @@ def record_step():
         st.session_state.step_records[current_step] = {
             'start_time': None,
             'attempts': [],  # 存储每次尝试 {timestamp, answer, is_correct}
+            '_seen_answers': {},  # 已判定过的答案：编号集合 -> 是否正确
             'first_correct_time': None,
             'final_correct_time': None
         }
     
     record = st.session_state.step_records[current_step]
+    now = datetime.now(_TZ)
     
     # 步骤开始按钮
     if not record['start_time']:
         if st.button("▶️ 开始本步骤任务（点击后开始计时）"):
-            record['start_time'] = datetime.now(pytz.timezone("America/Edmonton")).isoformat()
+            record['start_time'] = now.isoformat()
+            record['_start_dt'] = now
             st.rerun()
         st.stop()
     
@@ -134,12 +241,15 @@ def record_step():
         submitted = st.form_submit_button("提交尝试")
         
         if submitted and answer:
-            now = datetime.now(pytz.timezone("America/Edmonton"))
             timestamp = now.isoformat()
             
-            # 检查答案是否正确
+            # 检查答案是否正确（相同编号集合的结果直接复用）
             answer_list = [s.strip() for s in answer.split() if s.strip()]
-            is_correct = set(target_ids).issubset(set(answer_list))
+            answer_key = frozenset(answer_list)
+            seen_answers = record.setdefault('_seen_answers', {})
+            is_correct = seen_answers.get(answer_key)
+            if is_correct is None:
+                is_correct = seen_answers[answer_key] = target_ids.issubset(answer_key)
             
             # 记录尝试
             attempt = {
@@ -156,13 +266,17 @@ def record_step():
             # 如果是最终正确（用户确认）
             if is_correct:
                 record['final_correct_time'] = timestamp
+                record['_final_dt'] = now
                 st.success("✅ 回答正确！")
             else:
                 st.error("❌ 回答错误，请继续尝试")
     
     # 显示当前状态
-    start_time = datetime.fromisoformat(record['start_time'])
-    elapsed = round((datetime.now(pytz.timezone("America/Edmonton")) - start_time).total_seconds(), 1)
+    # ISO 字符串仅用于导出，计时使用缓存的 datetime（缺失时解析一次）
+    if '_start_dt' not in record:
+        record['_start_dt'] = datetime.fromisoformat(record['start_time'])
+    start_time = record['_start_dt']
+    elapsed = round((now - start_time).total_seconds(), 1)
     
     col1, col2 = st.columns(2)
     with col1:
@@ -182,30 +296,19 @@ def record_step():
                 first_attempt_correct = record['attempts'][0]['is_correct']
             
             # 计算总耗时
-            final_correct_time = datetime.fromisoformat(record['final_correct_time'])
-            total_duration = round((final_correct_time - start_time).total_seconds(), 2)
+            if '_final_dt' not in record:
+                record['_final_dt'] = datetime.fromisoformat(record['final_correct_time'])
+            total_duration = round((record['_final_dt'] - start_time).total_seconds(), 2)
             
             # 计算错误次数
             error_count = sum(1 for a in record['attempts'] if not a['is_correct'])
             
-            # 保存实验记录
-            step_data = {
-                "RecordType": "Experiment",
-                "Participant": st.session_state.participant_id,
-                "StepID": current_step,
-                "StepGroup": current_group,
-                "System": current_system,
-                "TargetLabel": target_label,
-                "StartTime": record['start_time'],
-                "EndTime": record['final_correct_time'],
-                "TotalDuration": total_duration,
-                "AttemptCount": len(record['attempts']),
-                "ErrorCount": error_count,
-                "FirstAttemptCorrect": first_attempt_correct,  # 优化变量名
-                "Note": note
-            }
-            
-            st.session_state.data.append(step_data)
+            # 保存实验记录（列顺序与 _EXP_COLS 一致）
+            st.session_state.experiment_rows.append((
+                st.session_state.participant_id, current_step, current_group, current_system, target_label,
+                record['start_time'], record['final_correct_time'], total_duration, len(record['attempts']),
+                error_count, first_attempt_correct, note
+            ))
             
             # 检查是否完成当前步骤组
             if current_step in [3, 6, 9]:
@@ -223,7 +326,9 @@ def record_step():
     if col2.button("↩️ 重置本步骤"):
         st.session_state.step_records[current_step] = {
             'start_time': record['start_time'],  # 保留开始时间
+            '_start_dt': start_time,
             'attempts': [],
+            '_seen_answers': {},
             'first_correct_time': None,
             'final_correct_time': None
         }
@@ -232,7 +337,7 @@ def record_step():
 # 步骤组完成页面
 def show_group_complete():
     current_step = st.session_state.current_step
-    participant_id = int(st.session_state.participant_id)
+    participant_id = st.session_state.participant_id_int
     group = get_current_group(current_step)
     system = get_system_for_group(participant_id, group)
     
@@ -249,157 +354,50 @@ def show_group_complete():
 # 问卷页面（优化后的界面）
 def questionnaire():
     current_step = st.session_state.current_step
-    participant_id = int(st.session_state.participant_id)
+    participant_id = st.session_state.participant_id_int
     group = get_current_group(current_step)
     system = get_system_for_group(participant_id, group)
     
     st.header(f"{system} System Questionnaire")
     with st.form(key=f"questionnaire_form_step_{current_step}"):
 
-        likert_labels = ["1 (Strongly Disagree)", "2", "3", "4", "5", "6", "7 (Strongly Agree)"]
-        
         # 创建更美观的问卷布局
         def question_block(question_key, english, chinese):
-            st.markdown(f"**{question_key}**")
-            st.markdown(f"<div style='margin-bottom: 8px;'>{english}</div>", unsafe_allow_html=True)
-            st.markdown(f"<div style='margin-bottom: 16px;'>{chinese}</div>", unsafe_allow_html=True)
-            return st.radio("", likert_labels, horizontal=True, index=None, key=question_key)
+            st.markdown(
+                f"<div><b>{question_key}</b>"
+                f"<div style='margin: 8px 0;'>{english}</div>"
+                f"<div style='margin-bottom: 16px;'>{chinese}</div></div>",
+                unsafe_allow_html=True
+            )
+            return st.radio("", _LIKERT_LABELS, horizontal=True, index=None, key=question_key)
+        
+        # 渲染题目的同时直接记录得分和未作答项
+        scores = {}
+        missing = []
+        def ask(questions):
+            for k, en, zh in questions:
+                v = question_block(k, en, zh)
+                if v is None:
+                    missing.append(k)
+                else:
+                    scores[k] = _LIKERT_SCORE[v]
+        
+        st.markdown(_SYSTEM_HEADER_TMPL.format(system=system))
         
         with st.expander("🧠 SART – Situation Awareness", expanded=True):
             # SART 问卷
             st.markdown("### 🧠 SART – Situation Awareness")
-            st.markdown(f"""
-            **System being evaluated: `{system}`**
-
-            Please evaluate this system (the one you just used in the last round of tasks) based on your experience in completing the component search tasks.  
-            Use a 7-point scale: 1 = Strongly disagree, 7 = Strongly agree.
-
-            请根据您刚刚完成的构件查找任务，评价“该系统”（当前轮次所使用的系统）的表现。  
-            每个问题请根据您的实际体验程度，选择 1 到 7 分（1 = 非常不同意，7 = 非常同意）。
-
-            """)
-
-            sart = {}
-            sart_questions = [
-                ("SART_1", 
-                "I received enough information to help me quickly identify the target component.", 
-                "我获得了足够的信息来帮助我快速查找到目标构件。"),
-                ("SART_2", 
-                "The information provided by the system was clear and accurate.", 
-                "系统提供的信息清晰、准确，有助于我识别正确的构件。"),
-                ("SART_3", 
-                "I clearly understood what was happening during the component search tasks.", 
-                "我能清楚理解查找任务中的提示与状态信息。"),
-                ("SART_4", 
-                "The task environment and recognition process were complex.", 
-                "任务环境和识别过程较为复杂。"),
-                ("SART_5", 
-                "The task environment and information changed unexpectedly or frequently during the task.", 
-                "任务环境和出现的信息变化频繁或难以预料。"),
-                ("SART_6", 
-                "The system behavior or visual information was inconsistent or unpredictable during the task.", 
-                "任务中系统行为或视觉提示不一致或不可预测。"),
-                ("SART_7", 
-                "I had to concentrate intensely to stay focused during the entire object search process.", 
-                "我必须全程高度集中注意力，才能在整个构件查找过程中保持专注。"),
-                ("SART_8", 
-                "I still had enough mental resources left to process other environmental information during the task.", 
-                "我还有足够的精力来注意其他环境信息。"),
-                ("SART_9", 
-                "I had to exert a lot of effort to understand the system's instructions and locate the correct component.", 
-                "我必须付出很大努力才能理解系统提示并找到正确的构件。"),
-                ("SART_10", 
-                "I remained alert and attentive throughout the tasks.", 
-                "我在任务中始终保持专注与警觉。")
-            ]
-
-            for k, en, zh in sart_questions:
-                sart[k] = question_block(k, en, zh)
+            ask(_SART_QUESTIONS)
         
         with st.expander("💻 System Usability & Experience", expanded=False):
-                
             # System Usability 问卷
             st.markdown("### 💻 System Usability & Experience")
-            st.markdown(f"""
-            **System being evaluated: `{system}`**
-
-            Please evaluate this system (the one you just used in the last round of tasks) based on your experience in completing the component search tasks.  
-            Use a 7-point scale: 1 = Strongly disagree, 7 = Strongly agree.
-
-            请根据您刚刚完成的构件查找任务，评价“该系统”（当前轮次所使用的系统）的表现。  
-            每个问题请根据您的实际体验程度，选择 1 到 7 分（1 = 非常不同意，7 = 非常同意）。
-            
-            """)
-
-            su = {}
-            su_questions = [
-                ("SU_1", 
-                "This system provided information that was highly relevant to my task.", 
-                "该系统提供的信息与我当前的任务高度相关。"),
-                ("SU_2", 
-                "This system's prompts effectively guided me to the correct target.", 
-                "该系统的提示成功引导我找到正确目标。"),
-                ("SU_3", 
-                "This system's visual prompts were excessive or distracting.", 
-                "该系统的提示信息过多或让我感到分心。"),
-                ("SU_4", 
-                "The prompts were stable and consistent throughout this system.", 
-                "该系统的提示表现稳定、一致，没有跳动或不连贯。"),
-                ("SU_5", 
-                "I trusted this system's information to be reliable and accurate.", 
-                "我信任该系统提供的信息是可靠且准确的。"),
-                ("SU_6", 
-                "The system provided guidance at appropriate timing.", 
-                "该系统在恰当的时间点提供了提示，有助于我及时完成任务。"),
-                ("SU_7", 
-                "The system's interface was visually clean and well-organized.", 
-                "该系统界面整洁、信息排布合理，不混乱。"),
-                ("SU_8", 
-                "Overall, I am satisfied with using this system.", 
-                "总体而言，我对该系统的使用体验感到满意。")
-            ]
-            for k, en, zh in su_questions:
-                su[k] = question_block(k, en, zh)
-
-
+            ask(_SU_QUESTIONS)
+        
         with st.expander("⚙️ NASA-TLX – Task Load Index", expanded=False):
             # NASA-TLX 问卷
             st.markdown("### ⚙️ NASA-TLX - Task Load Index")
-
-            st.markdown(f"""
-            **System being evaluated: `{system}`**
-
-            Please evaluate this system (the one you just used in the last round of tasks) based on your experience in completing the component search tasks.  
-            Use a 7-point scale: 1 = Strongly disagree, 7 = Strongly agree.
-
-            请根据您刚刚完成的构件查找任务，评价“该系统”（当前轮次所使用的系统）的表现。  
-            每个问题请根据您的实际体验程度，选择 1 到 7 分（1 = 非常不同意，7 = 非常同意）。
-            
-            """)
-            tlx = {}
-            
-            tlx_questions = [
-                ("TLX_1", 
-                "How mentally demanding was the task?", 
-                "这个任务在心理/思维上对你有多大挑战？"),
-                ("TLX_2", 
-                "How physically demanding was the task?", 
-                "这个任务在体力上对你有多大挑战？"),
-                ("TLX_3", 
-                "How hurried or rushed was the pace of the task?", 
-                "这个任务的节奏是否让你感觉匆忙或赶时间？"),
-                ("TLX_4", 
-                "How successful were you in accomplishing what you were asked to do?", 
-                "你认为自己完成任务的成功程度如何？"),
-                ("TLX_5", 
-                "How hard did you have to work to accomplish your level of performance?", 
-                "为了达到目前的任务表现，你付出了多大努力？"),
-                ("TLX_6", 
-                "How insecure, discouraged, irritated, stressed, and annoyed were you?", 
-                "你在任务中感到多少不安、沮丧、焦虑、烦躁？")
-            ]
-            for k, en, zh in tlx_questions:
-                tlx[k] = question_block(k, en, zh)
+            ask(_TLX_QUESTIONS)
         
         col1, col2 = st.columns([1, 1])
         back = col1.form_submit_button("⬅️ 返回上一步")
@@ -412,25 +410,15 @@ def questionnaire():
         
         if submit:
             # 验证问卷完整性
-            missing = [k for k, v in {**sart, **su, **tlx}.items() if v is None]
             if missing:
                 st.error(f"⚠️ 请完整填写所有问题再提交！缺失项: {len(missing)}")
                 st.stop()
             
-            # 创建问卷记录
-            result = {
-                "RecordType": "Questionnaire",
-                "Participant": st.session_state.participant_id,
-                "System": system,
-                "StepGroup": group
-            }
-            
-            # 添加问卷答案
-            result.update({k: parse_likert(v) for k, v in sart.items()})
-            result.update({k: parse_likert(v) for k, v in su.items()})
-            result.update({k: parse_likert(v) for k, v in tlx.items()})
-            
-            st.session_state.data.append(result)
+            # 保存问卷记录（列顺序与 _Q_COLS 一致）
+            st.session_state.questionnaire_rows.append((
+                st.session_state.participant_id, system, group,
+                *(scores[k] for k in _Q_COLS[3:])
+            ))
             st.session_state.show_questionnaire = False
             st.session_state.current_step += 1
             
@@ -439,61 +427,72 @@ def questionnaire():
                 st.session_state.experiment_complete = True
             st.rerun()
 
+# 打包导出数据；记录不变时直接返回缓存的 zip 字节
+@st.cache_data(show_spinner=False, ttl=24 * 60 * 60)
+def build_export_zip(experiment_rows, questionnaire_rows):
+    # 创建内存中的 zip 文件
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zip_file:
+        # 添加实验数据 CSV
+        if experiment_rows:
+            experiment_df = records_to_df(experiment_rows, _EXP_COLS)
+            with zip_file.open("experiment_data.csv", "w") as f, io.TextIOWrapper(f, encoding="utf-8", newline="") as csv_file:
+                experiment_df.to_csv(csv_file, index=False)
+        
+        # 添加问卷数据 CSV
+        if questionnaire_rows:
+            questionnaire_df = records_to_df(questionnaire_rows, _Q_COLS)
+            with zip_file.open("questionnaire_data.csv", "w") as f, io.TextIOWrapper(f, encoding="utf-8", newline="") as csv_file:
+                questionnaire_df.to_csv(csv_file, index=False)
+    
+    return zip_buffer.getvalue()
+
+# 导出单个 Parquet 文件；记录不变时直接返回缓存的字节
+@st.cache_data(show_spinner=False, ttl=24 * 60 * 60)
+def build_export_parquet(rows, columns):
+    parquet_buffer = io.BytesIO()
+    records_to_df(rows, columns).to_parquet(parquet_buffer, compression="snappy", index=False)
+    return parquet_buffer.getvalue()
+
 # 主控制流
-if 'participant_id' not in st.session_state:
+if 'participant_id_int' not in st.session_state:
     setup_page()
 elif st.session_state.experiment_complete:
     st.balloons()
     st.success("✅ 实验完成！Experiment Complete!")
     
-    # 分离实验数据和问卷数据
-    experiment_data = [r for r in st.session_state.data if r.get("RecordType") == "Experiment"]
-    questionnaire_data = [r for r in st.session_state.data if r.get("RecordType") == "Questionnaire"]
-    
-    # 创建数据框
-    experiment_df = pd.DataFrame(experiment_data)
-    questionnaire_df = pd.DataFrame(questionnaire_data)
-    
-    # 创建内存中的 zip 文件
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-        # 添加实验数据 CSV
-        if not experiment_df.empty:
-            # 选择实验数据需要的列
-            experiment_cols = [
-                "Participant", "StepID", "StepGroup", "System", "TargetLabel",
-                "StartTime", "EndTime", "TotalDuration", "AttemptCount",
-                "ErrorCount", "FirstAttemptCorrect", "Note"
-            ]
-            experiment_clean = experiment_df[experiment_cols]
-            zip_file.writestr("experiment_data.csv", experiment_clean.to_csv(index=False))
-        
-        # 添加问卷数据 CSV
-        if not questionnaire_df.empty:
-            # 选择问卷数据需要的列
-            questionnaire_cols = ["Participant", "System", "StepGroup"]
-            questionnaire_cols += [col for col in questionnaire_df.columns if col.startswith("SART_")]
-            questionnaire_cols += [col for col in questionnaire_df.columns if col.startswith("SU_")]
-            questionnaire_cols += [col for col in questionnaire_df.columns if col.startswith("TLX_")]
-            
-            questionnaire_clean = questionnaire_df[questionnaire_cols]
-            zip_file.writestr("questionnaire_data.csv", questionnaire_clean.to_csv(index=False))
+    experiment_rows = tuple(st.session_state.experiment_rows)
+    questionnaire_rows = tuple(st.session_state.questionnaire_rows)
     
     # 准备下载按钮
     st.markdown("### 📦 下载实验数据")
     st.download_button(
         label="📥 下载数据包 (ZIP)",
-        data=zip_buffer.getvalue(),
+        data=build_export_zip(experiment_rows, questionnaire_rows),
         file_name=f"experiment_data_{st.session_state.participant_id}.zip",
         mime="application/zip"
     )
     
-    # 显示数据预览
+    if _HAS_PYARROW and st.checkbox("同时提供 Parquet 格式下载"):
+        for name, rows, cols in (
+            ("experiment_data", experiment_rows, _EXP_COLS),
+            ("questionnaire_data", questionnaire_rows, _Q_COLS)
+        ):
+            if not rows:
+                continue
+            st.download_button(
+                label=f"📥 下载 {name}.parquet",
+                data=build_export_parquet(rows, cols),
+                file_name=f"{name}_{st.session_state.participant_id}.parquet",
+                mime="application/octet-stream"
+            )
+    
+    # 显示数据预览（只用前 5 行构建数据框）
     st.subheader("实验数据预览")
-    st.dataframe(experiment_df.head())
+    st.dataframe(records_to_df(experiment_rows[:5], _EXP_COLS))
     
     st.subheader("问卷数据预览")
-    st.dataframe(questionnaire_df.head())
+    st.dataframe(records_to_df(questionnaire_rows[:5], _Q_COLS))
     
     if st.button("🔄 开始新实验"):
         st.session_state.clear()